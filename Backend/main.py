@@ -1,39 +1,57 @@
 # backend/main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, WebSocket, WebSocketDisconnect, status, Request, Form
+from fastapi import BackgroundTasks, FastAPI, UploadFile, File, HTTPException, Depends, WebSocket, WebSocketDisconnect, status, Request, Response, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import PlainTextResponse
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 import asyncio
+import hashlib
 import json
 import uuid
 import os
-import aiofiles
+import time
+from xml.sax.saxutils import escape
+import aiofiles.tempfile
 import httpx
+import orjson
+from cachetools import TTLCache
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
 
 
 # AI/ML imports
-from transformers import Wav2Vec2FeatureExtractor, WavLMForXVector, ViTImageProcessor, ViTForImageClassification
+from transformers import AutoConfig, Wav2Vec2FeatureExtractor, WavLMForXVector, ViTImageProcessor, ViTForImageClassification
 import torch
 import numpy as np
 import librosa
+import soundfile as sf
+import torchaudio
 import io
 from PIL import Image
 import cv2
-import tempfile
-import shutil
+try:
+    import decord  # optional: batched frame decode for video sampling
+except ImportError:
+    decord = None
+import torchvision.transforms.functional as TF
+from torchvision.io import ImageReadMode, decode_jpeg
 
 # JWT
 import jwt
-from passlib.context import CryptContext
+import bcrypt
 
 # Database
-from sqlalchemy import create_engine, Column, String, Float, DateTime, Text, Enum as SQLEnum, Integer
+from sqlalchemy import Column, String, Float, DateTime, Text, Enum as SQLEnum, Integer, Index, and_, case as sql_case, event, func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
 import enum
 
 # =============================================================================
@@ -42,11 +60,22 @@ import enum
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+TOKEN_CACHE_TTL = 60  # seconds a decoded token is reused without re-verifying
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Disable in production once the schema is managed outside the app
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "true").lower() == "true"
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 
+# Optional Redis for idempotency keys and rate limits shared across workers
+REDIS_URL = os.getenv("REDIS_URL")
+IDEMPOTENCY_TTL = 3600  # seconds a repeated upload returns the original result
+REDIS_TIMEOUT = 0.5  # seconds; an unreachable Redis must not stall requests
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10/minute")
+
 # CORS origins - update for production
 CORS_ORIGINS = [
     "http://localhost:5173",
@@ -57,11 +86,86 @@ CORS_ORIGINS = [
     os.getenv("FRONTEND_URL", "http://localhost:5173"),
 ]
 
+# Inference device - models run in half precision when a GPU is available, preferring
+# bfloat16 (same range as FP32) on GPUs that support it. MODEL_DTYPE overrides the choice.
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+MODEL_DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+if os.getenv("MODEL_DTYPE"):
+    MODEL_DTYPE = MODEL_DTYPES[os.getenv("MODEL_DTYPE")]
+elif DEVICE == "cuda":
+    MODEL_DTYPE = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+else:
+    MODEL_DTYPE = torch.float32
+COMPILE_MODELS = os.getenv("COMPILE_MODELS", "true").lower() == "true"
+QUANTIZE_CPU_MODELS = os.getenv("QUANTIZE_CPU_MODELS", "true").lower() == "true"
+WARMUP_ITERATIONS = 3  # torch.compile needs a few calls before its graphs stabilize
+
+# Model forward passes run in this many dedicated processes (0 = inside the API process)
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))
+# Otherwise each model's forward passes run on one dedicated thread, off the event loop
+# Image/audio/video decoding and preprocessing get their own threads so they never
+# queue ahead of a forward pass
+PREPROCESS_THREADS = int(os.getenv("PREPROCESS_THREADS", str(min(4, os.cpu_count() or 1))))
+# Tensors handed to worker processes are pickled, so keep preprocessing on the CPU then
+PREPROCESS_DEVICE = "cpu" if INFERENCE_PROCESSES else DEVICE
+
+if DEVICE == "cpu":
+    # Leave cores for the FastAPI threadpool instead of oversubscribing them
+    torch.set_num_threads(min(4, os.cpu_count() or 1))
+    torch.set_num_interop_threads(1)
+
+# Micro-batching window for concurrent inference requests
+IMAGE_MAX_BATCH = int(os.getenv("IMAGE_MAX_BATCH", "16"))
+SPEAKER_MAX_BATCH = int(os.getenv("SPEAKER_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "15"))
+# Compiled image batches are padded up to these sizes so each one reuses a captured graph
+IMAGE_BATCH_BUCKETS = sorted({min(1 << i, IMAGE_MAX_BATCH) for i in range(IMAGE_MAX_BATCH.bit_length() + 1)})
+
+# Dashboard aggregates are cached in-process for this many seconds
+STATS_CACHE_TTL = 30
+CHART_CACHE_TTL = 300
+
+# Frames sampled per video; clips up to SEQUENTIAL_DECODE_MAX_FRAMES long are decoded in
+# one pass, longer ones by seeking (each seek re-decodes from the previous keyframe)
+VIDEO_SAMPLE_FRAMES = 8
+SEQUENTIAL_DECODE_MAX_FRAMES = 900
+
+# Accepted upload extensions (lowercase, without the dot)
+IMAGE_EXTENSIONS = frozenset({"png", "jpg", "jpeg", "bmp", "webp"})
+AUDIO_EXTENSIONS = frozenset({"wav", "mp3", "m4a", "ogg", "flac"})
+VIDEO_EXTENSIONS = frozenset({"mp4", "mov", "avi", "mkv", "webm"})
+# Audio containers libsndfile has no decoder for go straight to librosa/audioread
+LIBROSA_AUDIO_EXTENSIONS = frozenset({"m4a"})
+
+# Uploads are streamed to disk in 1 MiB chunks and rejected above this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+# Queue snapshots buffered per dashboard connection before it is dropped as too slow
+MAX_PENDING_SENDS = 32
+# Queue changes are coalesced into at most one dashboard broadcast per interval
+BROADCAST_INTERVAL_MS = 50
+
 # =============================================================================
 # Database Setup
 # =============================================================================
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Plain sqlite:// and postgresql:// URLs are mapped onto their async drivers
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+_scheme, _sep, _rest = DATABASE_URL.partition("://")
+ASYNC_DATABASE_URL = f"{ASYNC_DRIVERS.get(_scheme, _scheme)}{_sep}{_rest}"
+
+# aiosqlite file databases use NullPool, which rejects pool sizing arguments
+_pool_args = {} if ASYNC_DATABASE_URL.startswith("sqlite") else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True, **_pool_args)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a detection request is writing
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
 Base = declarative_base()
 
 # Enums
@@ -88,9 +192,12 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+def new_case_id() -> str:
+    return f"case-{uuid.uuid4().hex[:8]}"
+
 class Case(Base):
     __tablename__ = "cases"
-    id = Column(String, primary_key=True, default=lambda: f"case-{uuid.uuid4().hex[:8]}")
+    id = Column(String, primary_key=True, default=new_case_id)
     media_type = Column(SQLEnum(MediaType), nullable=False)
     status = Column(SQLEnum(CaseStatus), default=CaseStatus.analyzing)
     confidence = Column(Float, default=0)
@@ -106,6 +213,12 @@ class Case(Base):
     worker_id = Column(String, nullable=True)
     processing_time_ms = Column(Integer, nullable=True)
     filename = Column(String, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_cases_submitted_at", "submitted_at"),
+        Index("ix_cases_status_submitted", "status", "submitted_at"),
+        Index("ix_cases_media_status", "media_type", "status", "submitted_at"),
+    )
 
 class Feedback(Base):
     __tablename__ = "feedback"
@@ -114,6 +227,16 @@ class Feedback(Base):
     rating = Column(SQLEnum(FeedbackRating), nullable=False)
     comment = Column(Text, nullable=True)
     submitted_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_feedback_rating_submitted", "rating", "submitted_at"),
+    )
+
+def create_indexes(sync_conn):
+    # create_all skips tables that already exist, so add any missing indexes separately
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
 
 # =============================================================================
 # Pydantic Schemas
@@ -126,24 +249,29 @@ class LoginResponse(BaseModel):
     token: str
     user: dict
 
+# Built straight from Case rows; validation aliases map the ORM column names
 class CaseResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
-    mediaType: str
-    status: str
+    mediaType: MediaType = Field(validation_alias="media_type")
+    status: CaseStatus
     confidence: float
-    submittedAt: str
-    completedAt: Optional[str]
+    submittedAt: datetime = Field(validation_alias="submitted_at")
+    completedAt: Optional[datetime] = Field(validation_alias="completed_at")
     verdict: str
-    faceScore: Optional[float]
-    voiceScore: Optional[float]
-    lipsyncScore: Optional[float]
+    faceScore: Optional[float] = Field(validation_alias="face_score")
+    voiceScore: Optional[float] = Field(validation_alias="voice_score")
+    lipsyncScore: Optional[float] = Field(validation_alias="lipsync_score")
 
 class CaseDetailsResponse(CaseResponse):
     explanation: Optional[str]
-    mediaUrl: Optional[str]
-    heatmapUrl: Optional[str]
-    workerId: Optional[str]
-    processingTimeMs: Optional[int]
+    mediaUrl: Optional[str] = Field(validation_alias="media_url")
+    heatmapUrl: Optional[str] = Field(validation_alias="heatmap_url")
+    workerId: Optional[str] = Field(validation_alias="worker_id")
+    processingTimeMs: Optional[int] = Field(validation_alias="processing_time_ms")
+
+case_list_adapter = TypeAdapter(List[CaseResponse])
 
 class StatsResponse(BaseModel):
     totalVerificationsToday: int
@@ -171,14 +299,17 @@ class FeedbackResponse(BaseModel):
 # =============================================================================
 # Password & JWT Utilities
 # =============================================================================
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# bcrypt is called directly; hashes stay compatible with the ones passlib wrote
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    except ValueError:
+        return False
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=12)).decode("utf-8")
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -186,63 +317,117 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+token_cache = TTLCache(maxsize=4096, ttl=TOKEN_CACHE_TTL)
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    # Async so the cache is only touched from the event loop, never from threadpool workers
+    token = credentials.credentials
+    payload = token_cache.get(token)
+    if payload is not None and payload["exp"] > time.time():
         return payload
+    
+    try:
+        # exp is required: cached payloads are trusted until it passes
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp"]})
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    token_cache[token] = payload
+    return payload
 
 # =============================================================================
 # Database Dependency
 # =============================================================================
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # =============================================================================
 # WebSocket Manager for Queue
 # =============================================================================
+class QueueClient:
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_SENDS)
+        self.writer: Optional[asyncio.Task] = None
+
 class QueueManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.queue_items: List[dict] = []
+        self.clients: List[QueueClient] = []
+        self.queue_items: Dict[str, dict] = {}
+        self._closing: set = set()
+        self._dirty = asyncio.Event()
+        self._payload: Optional[str] = None
+
+    def serialize(self) -> str:
+        # Cached until the next change to the queue
+        if self._payload is None:
+            self._payload = orjson.dumps(list(self.queue_items.values())).decode()
+        return self._payload
+
+    def _changed(self):
+        self._payload = None
+        self._dirty.set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = QueueClient(websocket)
         # Send current queue state
-        await websocket.send_json(self.queue_items)
+        client.outbox.put_nowait(self.serialize())
+        client.writer = asyncio.create_task(self._write(client))
+        self.clients.append(client)
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        for client in self.clients:
+            if client.websocket is websocket:
+                self.clients.remove(client)
+                client.writer.cancel()
+                break
+
+    async def _write(self, client: QueueClient):
+        try:
+            while True:
+                await client.websocket.send_text(await client.outbox.get())
+        except Exception:
+            self.disconnect(client.websocket)
 
-    async def broadcast(self, data: List[dict]):
-        self.queue_items = data
-        for connection in self.active_connections:
+    async def run(self):
+        """Background task: send the latest queue state after changes, at most once per interval."""
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            self._broadcast()
+            await asyncio.sleep(BROADCAST_INTERVAL_MS / 1000)
+
+    def _broadcast(self):
+        # Encode once; each client drains its own bounded outbox so a slow one can't stall the rest
+        payload = self.serialize()
+        for client in list(self.clients):
             try:
-                await connection.send_json(data)
-            except:
-                pass
+                client.outbox.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Drop slow consumers instead of buffering for them without bound
+                self.disconnect(client.websocket)
+                task = asyncio.create_task(client.websocket.close(code=1013, reason="backpressure"))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
 
     def add_item(self, item: dict):
-        self.queue_items.append(item)
+        self.queue_items[item["id"]] = item
+        self._changed()
 
     def remove_item(self, item_id: str):
-        self.queue_items = [i for i in self.queue_items if i["id"] != item_id]
+        if self.queue_items.pop(item_id, None) is not None:
+            self._changed()
 
     def update_item(self, item_id: str, progress: int, status: str):
-        for item in self.queue_items:
-            if item["id"] == item_id:
-                item["progress"] = progress
-                item["status"] = status
-                break
+        item = self.queue_items.get(item_id)
+        if item:
+            item["progress"] = progress
+            item["status"] = status
+            self._changed()
 
 queue_manager = QueueManager()
 
@@ -253,10 +438,21 @@ feature_extractor = None
 speaker_model = None
 image_processor = None
 image_model = None
+id2label = {}
 models_loaded = False
 
+# Lowercased classifier labels that count as a manipulated image or frame
+FAKE_LABELS = frozenset({"fake", "deepfake", "manipulated"})
+
+inference_pool: Optional[ProcessPoolExecutor] = None
+is_inference_worker = False
+
+# Blocking media decodes run here so the event loop keeps serving other requests and
+# websocket updates (forward passes use each batcher's own thread)
+_CPU_POOL = ThreadPoolExecutor(max_workers=PREPROCESS_THREADS, thread_name_prefix="preprocess")
+
 async def load_models():
-    global feature_extractor, speaker_model, image_processor, image_model, models_loaded
+    global feature_extractor, speaker_model, image_processor, image_model, id2label, models_loaded
     
     if models_loaded:
         return
@@ -264,60 +460,383 @@ async def load_models():
     print("🔄 Loading AI models...")
     
     try:
-        print("  → Loading WavLM speaker verification model...")
         feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained('microsoft/wavlm-base-plus-sv')
-        speaker_model = WavLMForXVector.from_pretrained('microsoft/wavlm-base-plus-sv')
+        image_processor = ViTImageProcessor.from_pretrained("prithivMLmods/Deep-Fake-Detector-v2-Model")
+        
+        if INFERENCE_PROCESSES and not is_inference_worker:
+            # Weights live in the worker processes; this process only preprocesses and batches
+            id2label = AutoConfig.from_pretrained("prithivMLmods/Deep-Fake-Detector-v2-Model").id2label
+            await start_inference_pool()
+            models_loaded = True
+            print(f"✅ Models loaded in {INFERENCE_PROCESSES} inference worker process(es)!")
+            return
+        
+        print("  → Loading WavLM speaker verification model...")
+        # Load weights straight into the target dtype/device instead of materializing an FP32 copy first
+        speaker_model = WavLMForXVector.from_pretrained(
+            'microsoft/wavlm-base-plus-sv', torch_dtype=MODEL_DTYPE, low_cpu_mem_usage=True, device_map=DEVICE
+        ).eval()
         
         print("  → Loading Deepfake Image Detector (ViT)...")
-        image_processor = ViTImageProcessor.from_pretrained("prithivMLmods/Deep-Fake-Detector-v2-Model")
-        image_model = ViTForImageClassification.from_pretrained("prithivMLmods/Deep-Fake-Detector-v2-Model")
+        image_model = ViTForImageClassification.from_pretrained(
+            "prithivMLmods/Deep-Fake-Detector-v2-Model", torch_dtype=MODEL_DTYPE, low_cpu_mem_usage=True, device_map=DEVICE
+        ).eval()
+        id2label = image_model.config.id2label
+        
+        if QUANTIZE_CPU_MODELS and DEVICE == "cpu" and MODEL_DTYPE == torch.float32:
+            # int8 Linear weights cut memory bandwidth ~4x and use FBGEMM's VNNI kernels
+            print("  → Quantizing models to int8 for CPU inference...")
+            speaker_model = torch.quantization.quantize_dynamic(speaker_model, {torch.nn.Linear}, dtype=torch.qint8)
+            image_model = torch.quantization.quantize_dynamic(image_model, {torch.nn.Linear}, dtype=torch.qint8)
+        
+        if COMPILE_MODELS and DEVICE == "cuda":
+            print("  → Compiling models with torch.compile...")
+            # Image batches are padded to fixed bucket sizes, so static shapes let Inductor
+            # autotune kernels per bucket (and capture CUDA graphs) at warmup
+            image_model = image_model.to(memory_format=torch.channels_last)
+            image_model = torch.compile(image_model, mode="max-autotune", dynamic=False)
+            # Audio clip lengths vary per request, so compile WavLM with dynamic shapes
+            speaker_model = torch.compile(speaker_model, dynamic=True)
+        
+        print("  → Warming up models...")
+        try:
+            await warmup_models()
+        except Exception as e:
+            if not hasattr(image_model, "_orig_mod"):
+                raise
+            print(f"⚠️ torch.compile failed, falling back to eager mode: {e}")
+            image_model = image_model._orig_mod
+            speaker_model = speaker_model._orig_mod
+            await warmup_models()
         
         models_loaded = True
-        print("✅ All models loaded successfully!")
+        print(f"✅ All models loaded successfully on {DEVICE} ({MODEL_DTYPE})!")
     except Exception as e:
         print(f"⚠️ Model loading failed: {e}")
         print("  → Running in mock mode (for development/testing)")
 
+def init_inference_worker(worker_counter):
+    # Pool initializer: load the models once into this worker process's globals
+    global is_inference_worker
+    is_inference_worker = True
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+    if DEVICE == "cuda":
+        # One worker per GPU (round-robin); plain "cuda" then means this worker's device
+        torch.cuda.set_device(worker_index % torch.cuda.device_count())
+    asyncio.run(load_models())
+    if not models_loaded:
+        # Raising breaks the pool (BrokenProcessPool) rather than leaving a worker that
+        # would accept forward passes without models
+        raise RuntimeError("inference worker failed to load models")
+
+def inference_worker_ready() -> bool:
+    return models_loaded
+
+async def start_inference_pool():
+    global inference_pool
+    # spawn, not fork: a forked child can't reinitialize CUDA
+    mp_context = multiprocessing.get_context("spawn")
+    inference_pool = ProcessPoolExecutor(
+        max_workers=INFERENCE_PROCESSES,
+        mp_context=mp_context,
+        initializer=init_inference_worker,
+        initargs=(mp_context.Value("i", 0),),
+    )
+    # Concurrent probes make the pool spawn its workers now and wait until at least one
+    # has loaded; a worker whose load fails breaks the pool, failing the probes
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(*(
+            loop.run_in_executor(inference_pool, inference_worker_ready) for _ in range(INFERENCE_PROCESSES)
+        ))
+    except Exception:
+        inference_pool.shutdown(cancel_futures=True)
+        inference_pool = None
+        raise
+
+def inference_context():
+    """Autocast context for model forward passes (no-op on CPU)."""
+    return torch.autocast(DEVICE, dtype=MODEL_DTYPE, enabled=DEVICE == "cuda")
+
+def host_to_device(tensor: torch.Tensor, **kwargs) -> torch.Tensor:
+    """Copy a tensor to the inference device; CPU tensors are pinned first so the copy is truly async."""
+    if DEVICE == "cuda" and not tensor.is_cuda:
+        tensor = tensor.pin_memory()
+    return tensor.to(DEVICE, non_blocking=True, **kwargs)
+
+def to_device(inputs) -> dict:
+    """Move processor outputs to the inference device, casting float tensors to the model dtype."""
+    return {
+        k: host_to_device(v, dtype=MODEL_DTYPE) if v.is_floating_point() else host_to_device(v)
+        for k, v in inputs.items()
+    }
+
+# =============================================================================
+# Inference Batching
+# =============================================================================
+class DynamicBatcher:
+    """Coalesces concurrent inference calls into a single batched forward pass."""
+
+    def __init__(self, forward, max_bs: int, name: str, max_wait_ms: float = MAX_WAIT_MS):
+        self.forward = forward
+        self.max_bs = max_bs
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # One thread per model: compiled CUDA graphs are recorded and replayed per thread,
+        # so warmup and every forward pass must run on the same one
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-inference")
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        # Every worker process can run a batch at once; the dedicated thread runs one
+        slots = asyncio.Semaphore(INFERENCE_PROCESSES if inference_pool else 1)
+        in_flight = set()
+        while True:
+            # Wait for a free slot first so requests keep accumulating into the next batch
+            await slots.acquire()
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_bs:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            task = asyncio.create_task(self._dispatch(items, slots))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+    async def _dispatch(self, items: list, slots: asyncio.Semaphore):
+        loop = asyncio.get_running_loop()
+        try:
+            batch = [item for item, _ in items]
+            outputs = await loop.run_in_executor(inference_pool or self.executor, self.forward, batch)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            slots.release()
+        
+        for (_, future), output in zip(items, outputs):
+            if not future.done():
+                future.set_result(output)
+
+def image_forward(batch: List[torch.Tensor]) -> List[torch.Tensor]:
+    """Classify a batch of preprocessed images, returning one logits row per image."""
+    # JPEG fast-path tensors may already be on the GPU while PIL-path ones are on the CPU
+    pixel_values = torch.stack([host_to_device(t, dtype=MODEL_DTYPE) for t in batch])
+    if hasattr(image_model, "_orig_mod"):
+        # Pad with zeros to the next bucket; the extra rows are dropped below
+        bucket = next(b for b in IMAGE_BATCH_BUCKETS if b >= len(batch))
+        pixel_values = torch.nn.functional.pad(pixel_values, (0, 0, 0, 0, 0, 0, 0, bucket - len(batch)))
+    if DEVICE == "cuda":
+        pixel_values = pixel_values.to(memory_format=torch.channels_last)
+    with torch.inference_mode(), inference_context():
+        logits = image_model(pixel_values=pixel_values).logits
+    return list(logits[:len(batch)].float().cpu())
+
+def speaker_forward(waveforms: List[np.ndarray]) -> List[torch.Tensor]:
+    """Embed a batch of 16 kHz waveforms, returning one L2-normalized x-vector per input."""
+    inputs = to_device(feature_extractor(waveforms, sampling_rate=16000, padding=True, return_tensors="pt"))
+    with torch.inference_mode(), inference_context():
+        embeddings = speaker_model(**inputs).embeddings
+    return list(torch.nn.functional.normalize(embeddings.float(), dim=-1).cpu())
+
+image_batcher = DynamicBatcher(image_forward, IMAGE_MAX_BATCH, "image")
+speaker_batcher = DynamicBatcher(speaker_forward, SPEAKER_MAX_BATCH, "speaker")
+
+def warmup_image():
+    size = image_processor.size
+    dummy_image = torch.zeros(3, size["height"], size["width"])
+    # A compiled image model sees every bucket size once before serving traffic
+    image_batch_sizes = IMAGE_BATCH_BUCKETS if hasattr(image_model, "_orig_mod") else [1]
+    for _ in range(WARMUP_ITERATIONS):
+        for batch_size in image_batch_sizes:
+            image_forward([dummy_image] * batch_size)
+
+def warmup_speaker():
+    dummy_audio = np.zeros(16000 * 4, dtype=np.float32)
+    for _ in range(WARMUP_ITERATIONS):
+        speaker_forward([dummy_audio])
+
+async def warmup_models():
+    """Run dummy inputs through both models so compilation happens before serving traffic."""
+    if is_inference_worker:
+        # Pool workers run every forward pass on their main thread
+        warmup_image()
+        warmup_speaker()
+        return
+    # Warm up on the threads that will serve the forward passes, one model at a time
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(image_batcher.executor, warmup_image)
+    await loop.run_in_executor(speaker_batcher.executor, warmup_speaker)
+
+# =============================================================================
+# Idempotency Cache
+# =============================================================================
+class IdempotencyCache:
+    """Detection results keyed by upload content hash; Redis when configured, else in-process.
+    
+    Best-effort: if Redis is unreachable, requests are processed uncached instead of failing.
+    """
+
+    def __init__(self, redis_url: Optional[str]):
+        self.redis = aioredis.from_url(
+            redis_url, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT
+        ) if redis_url else None
+        self.local = TTLCache(maxsize=1024, ttl=IDEMPOTENCY_TTL)
+
+    async def get(self, key: str) -> Optional[dict]:
+        if self.redis:
+            try:
+                value = await self.redis.get(key)
+            except RedisError as e:
+                print(f"⚠️ Idempotency cache read failed: {e}")
+                return None
+            return orjson.loads(value) if value else None
+        return self.local.get(key)
+
+    async def set(self, key: str, result: dict):
+        if self.redis:
+            try:
+                await self.redis.set(key, orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY), ex=IDEMPOTENCY_TTL)
+            except RedisError as e:
+                print(f"⚠️ Idempotency cache write failed: {e}")
+        else:
+            self.local[key] = result
+
+idempotency_cache = IdempotencyCache(REDIS_URL)
+
+# Shared client for Twilio media downloads (keeps TLS connections alive); opened in lifespan
+http_client: Optional[httpx.AsyncClient] = None
+
 # =============================================================================
 # App Initialization
 # =============================================================================
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global http_client
     # Startup
     print("🚀 Starting AfriGuard API...")
-    Base.metadata.create_all(bind=engine)
-    
-    # Create default admin user if not exists
-    db = SessionLocal()
-    try:
-        admin = db.query(User).filter(User.email == "admin@afriguard.com").first()
-        if not admin:
-            admin = User(
-                email="admin@afriguard.com",
-                name="Admin User",
-                hashed_password=get_password_hash("admin123")
+    http_client = httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=30,
+        auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if TWILIO_ACCOUNT_SID else None,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+    async with engine.begin() as conn:
+        if AUTO_CREATE_TABLES:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_indexes)
+        
+        # Create default admin user if not exists. The lookup avoids hashing a password on
+        # every boot; ON CONFLICT covers several workers seeding at the same time.
+        if not await conn.scalar(select(User.id).where(User.email == "admin@afriguard.com")):
+            result = await conn.execute(
+                text(
+                    "INSERT INTO users (id, email, name, hashed_password, created_at) "
+                    "VALUES (:id, :email, :name, :hashed_password, :created_at) "
+                    "ON CONFLICT (email) DO NOTHING"
+                ),
+                {
+                    "id": str(uuid.uuid4()),
+                    "email": "admin@afriguard.com",
+                    "name": "Admin User",
+                    "hashed_password": get_password_hash("admin123"),
+                    "created_at": datetime.utcnow(),
+                },
             )
-            db.add(admin)
-            db.commit()
-            print("📧 Default admin user created: admin@afriguard.com / admin123")
-    finally:
-        db.close()
+            if result.rowcount:
+                print("📧 Default admin user created: admin@afriguard.com / admin123")
     
-    # Load ML models in background
-    asyncio.create_task(load_models())
+    # Load and warm up ML models before accepting traffic, so no request races the
+    # loader into mock mode (uvicorn only binds once lifespan startup completes)
+    await load_models()
+    background_tasks = [asyncio.create_task(worker.run()) for worker in (image_batcher, speaker_batcher, queue_manager)]
     
     yield
     
     # Shutdown
     print("👋 Shutting down AfriGuard API...")
+    for task in background_tasks:
+        task.cancel()
+    if inference_pool:
+        inference_pool.shutdown(cancel_futures=True)
+    for batcher in (image_batcher, speaker_batcher):
+        batcher.executor.shutdown(wait=False, cancel_futures=True)
+    _CPU_POOL.shutdown(wait=False, cancel_futures=True)
+    await engine.dispose()
+    await http_client.aclose()
+    if idempotency_cache.redis:
+        await idempotency_cache.redis.aclose()
 
 app = FastAPI(
     title="AfriGuard Verify API",
     description="WhatsApp-first deepfake detection system with AI-powered analysis",
     version="2.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Per-IP rate limiting (login is the bcrypt-heavy endpoint); falls back to per-process
+# limits rather than failing logins while Redis is unreachable
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=REDIS_URL or "memory://",
+    storage_options={"socket_connect_timeout": REDIS_TIMEOUT, "socket_timeout": REDIS_TIMEOUT} if REDIS_URL else {},
+    in_memory_fallback_enabled=True,
+    swallow_errors=True,
+)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+class UploadSizeLimitMiddleware:
+    """Pure ASGI middleware rejecting request bodies over MAX_UPLOAD_BYTES with a 413.
+    
+    Bytes are counted as they are received, so chunked uploads without a Content-Length
+    are stopped before FastAPI spools them to disk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+            return await ORJSONResponse({"detail": "Upload too large"}, status_code=413)(scope, receive, send)
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > MAX_UPLOAD_BYTES:
+                    # FastAPI re-raises HTTPExceptions from body parsing as-is
+                    raise HTTPException(413, "Upload too large")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+# Registered first so CORS wraps it
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -330,30 +849,130 @@ app.add_middleware(
 # =============================================================================
 # Helper Functions
 # =============================================================================
-def case_to_response(case: Case) -> dict:
-    return {
-        "id": case.id,
-        "mediaType": case.media_type.value,
-        "status": case.status.value,
-        "confidence": case.confidence,
-        "submittedAt": case.submitted_at.isoformat() if case.submitted_at else None,
-        "completedAt": case.completed_at.isoformat() if case.completed_at else None,
-        "verdict": case.verdict,
-        "faceScore": case.face_score,
-        "voiceScore": case.voice_score,
-        "lipsyncScore": case.lipsync_score,
-    }
+# Mock results, score jitter and worker ids; only drawn from on the event loop thread
+_RNG = np.random.default_rng()
+
+stats_cache = TTLCache(maxsize=8, ttl=STATS_CACHE_TTL)
+chart_cache = TTLCache(maxsize=8, ttl=CHART_CACHE_TTL)
+stats_cache_lock = asyncio.Lock()
 
-def case_to_details_response(case: Case) -> dict:
-    response = case_to_response(case)
-    response.update({
-        "explanation": case.explanation,
-        "mediaUrl": case.media_url,
-        "heatmapUrl": case.heatmap_url,
-        "workerId": case.worker_id,
-        "processingTimeMs": case.processing_time_ms,
-    })
-    return response
+async def get_cached(cache: TTLCache, key, compute):
+    """Return a cached aggregate, computing it at most once per TTL window."""
+    result = cache.get(key)
+    if result is None:
+        async with stats_cache_lock:
+            result = cache.get(key)
+            if result is None:
+                result = cache[key] = await compute()
+    return result
+
+def file_extension(filename: str) -> str:
+    """Lowercase extension without the dot ("" when there is none)."""
+    _, dot, ext = filename.rpartition(".")
+    return ext.lower() if dot else ""
+
+async def save_upload(upload: UploadFile, suffix: str, hasher=None) -> str:
+    """Stream an upload to a temp file without blocking the event loop; returns its path."""
+    async with aiofiles.tempfile.NamedTemporaryFile("wb", suffix=suffix, delete=False) as tmp:
+        try:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                if hasher:
+                    hasher.update(chunk)
+                await tmp.write(chunk)
+        except Exception:
+            os.unlink(tmp.name)
+            raise
+    return tmp.name
+
+def preprocess_image(contents: bytes) -> torch.Tensor:
+    """Decode an uploaded image into normalized ViT pixel values of shape (C, H, W)."""
+    if contents[:3] == b"\xff\xd8\xff":
+        # JPEG fast path: decode (nvJPEG on GPU), resize and normalize as tensor ops
+        try:
+            img = decode_jpeg(torch.frombuffer(bytearray(contents), dtype=torch.uint8), mode=ImageReadMode.RGB, device=PREPROCESS_DEVICE)
+        except RuntimeError:
+            pass
+        else:
+            size = image_processor.size
+            img = TF.resize(img, [size["height"], size["width"]], antialias=True)
+            img = img.float() * image_processor.rescale_factor
+            return TF.normalize(img, mean=image_processor.image_mean, std=image_processor.image_std)
+    
+    # Shrink in uint8 before the processor converts to float, so a 4K upload never
+    # becomes a full-resolution float tensor
+    size = image_processor.size
+    pil_image = Image.open(io.BytesIO(contents)).convert("RGB")
+    pil_image = pil_image.resize((size["width"], size["height"]), Image.BILINEAR)
+    return image_processor(images=pil_image, return_tensors="pt")["pixel_values"][0]
+
+def extract_frames(path: str, num_frames: int = VIDEO_SAMPLE_FRAMES, size: Optional[tuple] = None):
+    """Sample frames evenly across a video; returns (RGB PIL frames, duration in seconds).
+    
+    Frames are resized to `size` (width, height) while still uint8 when given.
+    """
+    def to_image(frame, bgr: bool = True):
+        if size:
+            shrinking = frame.shape[1] > size[0] or frame.shape[0] > size[1]
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        if bgr:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return Image.fromarray(frame)
+    
+    if decord:
+        vr = decord.VideoReader(path, ctx=decord.cpu(0))
+        total = len(vr)
+        fps = vr.get_avg_fps()
+        duration = total / fps if fps > 0 else 0
+        if total == 0:
+            return [], duration
+        indices = np.linspace(0, total - 1, num_frames, dtype=int)
+        return [to_image(frame, bgr=False) for frame in vr.get_batch(indices).asnumpy()], duration
+    
+    cap = cv2.VideoCapture(path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    duration = total / fps if fps > 0 else 0
+    
+    # Short clips repeat indices; keep the repeats so each sample still counts once
+    indices, counts = np.unique(np.linspace(0, max(total-1, 0), num_frames, dtype=int), return_counts=True)
+    frames = []
+    if total <= SEQUENTIAL_DECODE_MAX_FRAMES:
+        # Single sequential pass: grab() every frame, but only retrieve() the sampled ones
+        wanted = dict(zip(indices.tolist(), counts.tolist()))
+        for i in range(int(indices[-1]) + 1):
+            if not cap.grab():
+                break
+            if i in wanted:
+                ret, frame = cap.retrieve()
+                if ret:
+                    frames.extend([to_image(frame)] * wanted[i])
+    else:
+        for i, count in zip(indices, counts):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(i))
+            ret, frame = cap.read()
+            if ret:
+                frames.extend([to_image(frame)] * count)
+    cap.release()
+    return frames, duration
+
+def load_audio(content: bytes, filename: str = "") -> np.ndarray:
+    """Decode audio bytes to a mono 16 kHz float32 waveform."""
+    if file_extension(filename) not in LIBROSA_AUDIO_EXTENSIONS:
+        try:
+            data, sr = sf.read(io.BytesIO(content), dtype="float32", always_2d=False)
+        except RuntimeError:
+            pass
+        else:
+            if data.ndim == 2:
+                data = data.mean(axis=1)
+            waveform = torch.from_numpy(data)
+            if sr != 16000:
+                waveform = torchaudio.functional.resample(waveform, sr, 16000)
+            return waveform.numpy()
+    
+    # Formats libsndfile can't decode (e.g. m4a) fall back to librosa/audioread
+    waveform, _ = librosa.load(io.BytesIO(content), sr=16000)
+    return waveform
 
 def generate_explanation(is_fake: bool, confidence: float, media_type: str) -> str:
     if is_fake:
@@ -366,14 +985,29 @@ def generate_explanation(is_fake: bool, confidence: float, media_type: str) -> s
     else:
         return f"Analysis found no significant manipulation indicators. The content appears authentic with {100-confidence:.1f}% confidence."
 
+async def _finalize_case(case: Case):
+    """Background task: insert a completed case and remove it from the live queue."""
+    try:
+        async with SessionLocal() as db:
+            db.add(case)
+            await db.commit()
+    except Exception as e:
+        print(f"⚠️ Failed to save case {case.id}: {e}")
+    finally:
+        queue_manager.remove_item(case.id)
+
 # =============================================================================
 # Authentication Endpoints
 # =============================================================================
 @app.post("/api/auth/login", response_model=LoginResponse)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
+@limiter.limit(LOGIN_RATE_LIMIT)
+async def login(request: Request, login_request: LoginRequest, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == login_request.email))
     
-    if not user or not verify_password(request.password, user.hashed_password):
+    # bcrypt takes ~250 ms at 12 rounds, so check it off the event loop
+    if not user or not await asyncio.get_running_loop().run_in_executor(
+        _CPU_POOL, verify_password, login_request.password, user.hashed_password
+    ):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"sub": user.id, "email": user.email})
@@ -394,47 +1028,55 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
 async def get_cases(
     mediaType: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: dict = Depends(verify_token)
 ):
-    query = db.query(Case).order_by(Case.submitted_at.desc())
+    query = select(Case).order_by(Case.submitted_at.desc())
     
     if mediaType and mediaType != "all":
-        query = query.filter(Case.media_type == mediaType)
+        query = query.where(Case.media_type == mediaType)
     if status and status != "all":
-        query = query.filter(Case.status == status)
+        query = query.where(Case.status == status)
     
-    cases = query.all()
-    return [case_to_response(c) for c in cases]
+    cases = (await db.execute(query)).scalars().all()
+    # Rows are converted by pydantic-core and returned directly so orjson encodes
+    # the datetimes and enums without a jsonable_encoder pass
+    return ORJSONResponse(case_list_adapter.dump_python(case_list_adapter.validate_python(cases)))
 
 @app.get("/api/cases/{case_id}")
 async def get_case(
     case_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: dict = Depends(verify_token)
 ):
-    case = db.query(Case).filter(Case.id == case_id).first()
+    case = await db.get(Case, case_id)
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
-    return case_to_details_response(case)
+    return ORJSONResponse(CaseDetailsResponse.model_validate(case).model_dump())
 
 # =============================================================================
 # Statistics Endpoints
 # =============================================================================
-@app.get("/api/stats", response_model=StatsResponse)
-async def get_stats(db: Session = Depends(get_db), _: dict = Depends(verify_token)):
+async def _compute_stats(db: AsyncSession) -> dict:
     today = datetime.utcnow().date()
     today_start = datetime.combine(today, datetime.min.time())
+    is_completed = Case.status == CaseStatus.completed
     
-    total_cases = db.query(Case).count()
-    today_cases = db.query(Case).filter(Case.submitted_at >= today_start).count()
+    # All counters in a single aggregate pass over cases
+    row = (await db.execute(select(
+        func.count().label("total"),
+        func.sum(sql_case((Case.submitted_at >= today_start, 1), else_=0)).label("today"),
+        func.sum(sql_case((is_completed, 1), else_=0)).label("completed"),
+        func.sum(sql_case((and_(is_completed, Case.confidence > 50), 1), else_=0)).label("deepfakes"),
+        func.avg(sql_case((is_completed, Case.confidence))).label("avg_confidence"),
+    ).select_from(Case))).one()
     
-    completed_cases = db.query(Case).filter(Case.status == CaseStatus.completed).all()
+    total_cases = row.total
+    today_cases = row.today or 0
     
-    if completed_cases:
-        deepfake_cases = sum(1 for c in completed_cases if c.confidence > 50)
-        deepfake_percentage = (deepfake_cases / len(completed_cases)) * 100
-        avg_confidence = sum(c.confidence for c in completed_cases) / len(completed_cases)
+    if row.completed:
+        deepfake_percentage = (row.deepfakes / row.completed) * 100
+        avg_confidence = row.avg_confidence
     else:
         deepfake_percentage = 0
         avg_confidence = 0
@@ -446,22 +1088,26 @@ async def get_stats(db: Session = Depends(get_db), _: dict = Depends(verify_toke
         "totalCases": total_cases if total_cases > 0 else 1543
     }
 
-@app.get("/api/stats/chart", response_model=List[ChartDataItem])
-async def get_chart_data(db: Session = Depends(get_db), _: dict = Depends(verify_token)):
+async def _compute_chart(db: AsyncSession) -> List[dict]:
+    today = datetime.utcnow().date()
+    cutoff = datetime.combine(today - timedelta(days=6), datetime.min.time())
+    day = func.date(Case.submitted_at).label("day")
+    
+    rows = (await db.execute(
+        select(
+            day,
+            func.count().label("verifications"),
+            func.sum(sql_case((and_(Case.confidence > 50, Case.status == CaseStatus.completed), 1), else_=0)).label("deepfakes"),
+        ).where(Case.submitted_at >= cutoff).group_by(day)
+    )).all()
+    # SQLite returns the day as a string, Postgres as a date
+    day_counts = {str(r.day): (r.verifications, r.deepfakes) for r in rows}
+    
     chart_data = []
     
     for i in range(6, -1, -1):
-        date = datetime.utcnow().date() - timedelta(days=i)
-        date_start = datetime.combine(date, datetime.min.time())
-        date_end = datetime.combine(date, datetime.max.time())
-        
-        day_cases = db.query(Case).filter(
-            Case.submitted_at >= date_start,
-            Case.submitted_at <= date_end
-        ).all()
-        
-        verifications = len(day_cases)
-        deepfakes = sum(1 for c in day_cases if c.confidence > 50 and c.status == CaseStatus.completed)
+        date = today - timedelta(days=i)
+        verifications, deepfakes = day_counts.get(date.isoformat(), (0, 0))
         
         # Fallback demo data if no real data
         if verifications == 0:
@@ -476,21 +1122,33 @@ async def get_chart_data(db: Session = Depends(get_db), _: dict = Depends(verify
     
     return chart_data
 
+@app.get("/api/stats", response_model=StatsResponse)
+async def get_stats(response: Response, db: AsyncSession = Depends(get_db), _: dict = Depends(verify_token)):
+    result = await get_cached(stats_cache, ("stats", datetime.utcnow().date()), lambda: _compute_stats(db))
+    response.headers["Cache-Control"] = f"private, max-age={STATS_CACHE_TTL}"
+    return result
+
+@app.get("/api/stats/chart", response_model=List[ChartDataItem])
+async def get_chart_data(response: Response, db: AsyncSession = Depends(get_db), _: dict = Depends(verify_token)):
+    result = await get_cached(chart_cache, ("chart", datetime.utcnow().date()), lambda: _compute_chart(db))
+    response.headers["Cache-Control"] = f"private, max-age={CHART_CACHE_TTL}"
+    return result
+
 # =============================================================================
 # Feedback Endpoints
 # =============================================================================
 @app.get("/api/feedback", response_model=List[FeedbackResponse])
 async def get_feedback(
     rating: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: dict = Depends(verify_token)
 ):
-    query = db.query(Feedback).order_by(Feedback.submitted_at.desc())
+    query = select(Feedback).order_by(Feedback.submitted_at.desc())
     
     if rating and rating != "all":
-        query = query.filter(Feedback.rating == rating)
+        query = query.where(Feedback.rating == rating)
     
-    feedbacks = query.all()
+    feedbacks = (await db.execute(query)).scalars().all()
     return [{
         "id": f.id,
         "caseId": f.case_id,
@@ -502,7 +1160,7 @@ async def get_feedback(
 @app.post("/api/feedback", response_model=FeedbackResponse, status_code=201)
 async def submit_feedback(
     request: FeedbackRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: dict = Depends(verify_token)
 ):
     feedback = Feedback(
@@ -511,8 +1169,7 @@ async def submit_feedback(
         comment=request.comment
     )
     db.add(feedback)
-    db.commit()
-    db.refresh(feedback)
+    await db.commit()
     
     return {
         "id": feedback.id,
@@ -541,90 +1198,96 @@ async def websocket_queue(websocket: WebSocket):
 # =============================================================================
 @app.post("/api/detect/image")
 async def detect_image_manipulation(
+    background_tasks: BackgroundTasks,
     image: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    if not image.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp')):
+    if file_extension(image.filename) not in IMAGE_EXTENSIONS:
         raise HTTPException(400, "Invalid image format. Supported: png, jpg, jpeg, bmp, webp")
     
-    # Create case record
+    return await _detect_image_from_bytes(await image.read(), image.filename, db, background_tasks)
+
+async def _detect_image_from_bytes(contents: bytes, filename: str, db: AsyncSession, background_tasks: BackgroundTasks) -> dict:
+    """Run image detection on raw bytes (shared by the upload endpoint and the WhatsApp webhook)."""
+    # Retried uploads of the same bytes return the original result
+    idempotency_key = f"idem:image:{hashlib.sha256(contents).hexdigest()}"
+    cached = await idempotency_cache.get(idempotency_key)
+    if cached:
+        return cached
+    
+    # Create case record; the id and timestamp are set here because the row is only
+    # written once, when the case finishes
     case = Case(
+        id=new_case_id(),
+        submitted_at=datetime.utcnow(),
         media_type=MediaType.image,
         status=CaseStatus.analyzing,
-        filename=image.filename,
-        worker_id=f"worker-{np.random.randint(1, 5)}"
+        filename=filename,
+        worker_id=f"worker-{_RNG.integers(1, 5)}"
     )
-    db.add(case)
-    db.commit()
-    
     # Add to queue
     queue_item = {
         "id": case.id,
         "mediaType": "image",
-        "submittedAt": case.submitted_at.isoformat(),
+        "submittedAt": case.submitted_at,
         "progress": 0,
         "status": "preprocessing",
         "workerId": case.worker_id
     }
     queue_manager.add_item(queue_item)
-    await queue_manager.broadcast(queue_manager.queue_items)
     
     start_time = datetime.utcnow()
     
     try:
-        contents = await image.read()
-        pil_image = Image.open(io.BytesIO(contents)).convert("RGB")
+        # Decode, resize and normalize off the event loop
+        loop = asyncio.get_running_loop()
+        if models_loaded:
+            pixel_values = await loop.run_in_executor(_CPU_POOL, preprocess_image, contents)
+        else:
+            await loop.run_in_executor(_CPU_POOL, lambda: Image.open(io.BytesIO(contents)).verify())
         
         # Update queue progress
         queue_manager.update_item(case.id, 30, "analyzing")
-        await queue_manager.broadcast(queue_manager.queue_items)
         
-        if models_loaded and image_processor and image_model:
-            inputs = image_processor(images=pil_image, return_tensors="pt")
+        if models_loaded:
+            logits = await image_batcher.submit(pixel_values)
             
-            with torch.no_grad():
-                logits = image_model(**inputs).logits
-                probs = torch.softmax(logits, dim=1)
-                predicted_idx = torch.argmax(logits, dim=1).item()
-                confidence = probs[0][predicted_idx].item() * 100
-                label = image_model.config.id2label[predicted_idx]
+            probs = torch.softmax(logits, dim=0)
+            predicted_idx = torch.argmax(logits).item()
+            confidence = probs[predicted_idx].item() * 100
+            label = id2label[predicted_idx]
             
-            is_fake = label.lower() in ["fake", "deepfake", "manipulated"]
+            is_fake = label.lower() in FAKE_LABELS
         else:
             # Mock response for development
-            is_fake = np.random.random() > 0.4
-            confidence = np.random.uniform(60, 95) if is_fake else np.random.uniform(10, 40)
+            is_fake = _RNG.random() > 0.4
+            confidence = _RNG.uniform(60, 95) if is_fake else _RNG.uniform(10, 40)
             label = "Fake" if is_fake else "Real"
         
         # Update queue progress
         queue_manager.update_item(case.id, 70, "llm_explaining")
-        await queue_manager.broadcast(queue_manager.queue_items)
         
         # Generate explanation
         explanation = generate_explanation(is_fake, confidence, "image")
         
         # Update queue progress
         queue_manager.update_item(case.id, 90, "sending_result")
-        await queue_manager.broadcast(queue_manager.queue_items)
         
         # Update case
         case.status = CaseStatus.completed
         case.confidence = round(confidence, 1)
         case.verdict = f"{confidence:.0f}% Likely {'Manipulated' if is_fake else 'Authentic'}"
-        case.face_score = round(confidence + np.random.uniform(-5, 5), 1) if is_fake else round(confidence - np.random.uniform(0, 10), 1)
+        case.face_score = round(confidence + _RNG.uniform(-5, 5), 1) if is_fake else round(confidence - _RNG.uniform(0, 10), 1)
         case.explanation = explanation
         case.completed_at = datetime.utcnow()
         case.processing_time_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
         
-        db.commit()
+        # Persist the result and leave the queue once the response has been sent
+        background_tasks.add_task(_finalize_case, case)
         
-        # Remove from queue
-        queue_manager.remove_item(case.id)
-        await queue_manager.broadcast(queue_manager.queue_items)
-        
-        return {
+        result = {
             "caseId": case.id,
-            "filename": image.filename,
+            "filename": filename,
             "predicted_label": label,
             "is_fake": is_fake,
             "confidence": round(confidence, 2),
@@ -636,76 +1299,89 @@ async def detect_image_manipulation(
         case.status = CaseStatus.failed
         case.verdict = "Analysis Failed"
         case.explanation = str(e)
-        db.commit()
+        db.add(case)
+        await db.commit()
         queue_manager.remove_item(case.id)
-        await queue_manager.broadcast(queue_manager.queue_items)
         raise HTTPException(500, f"Image analysis failed: {str(e)}")
+    
+    # Cache only after the analysis has fully succeeded; a cache outage can't fail it
+    await idempotency_cache.set(idempotency_key, result)
+    return result
 
 @app.post("/api/detect/audio")
 async def detect_audio_manipulation(
+    background_tasks: BackgroundTasks,
     audio_files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if len(audio_files) != 2:
         raise HTTPException(400, "Exactly 2 audio files required for speaker verification")
     
-    # Create case record
+    contents = []
+    hasher = hashlib.sha256()
+    for audio in audio_files:
+        if file_extension(audio.filename) not in AUDIO_EXTENSIONS:
+            raise HTTPException(400, f"Unsupported audio format: {audio.filename}")
+        content = await audio.read()
+        # Per-file digests, so two pairs whose bytes concatenate identically don't collide
+        hasher.update(hashlib.sha256(content).digest())
+        contents.append(content)
+    
+    # Retried uploads of the same pair return the original result
+    idempotency_key = f"idem:audio:{hasher.hexdigest()}"
+    cached = await idempotency_cache.get(idempotency_key)
+    if cached:
+        return cached
+    
+    # Create case record; the id and timestamp are set here because the row is only
+    # written once, when the case finishes
     case = Case(
+        id=new_case_id(),
+        submitted_at=datetime.utcnow(),
         media_type=MediaType.audio,
         status=CaseStatus.analyzing,
         filename=f"{audio_files[0].filename} vs {audio_files[1].filename}",
-        worker_id=f"worker-{np.random.randint(1, 5)}"
+        worker_id=f"worker-{_RNG.integers(1, 5)}"
     )
-    db.add(case)
-    db.commit()
-    
     # Add to queue
     queue_item = {
         "id": case.id,
         "mediaType": "audio",
-        "submittedAt": case.submitted_at.isoformat(),
+        "submittedAt": case.submitted_at,
         "progress": 0,
         "status": "preprocessing",
         "workerId": case.worker_id
     }
     queue_manager.add_item(queue_item)
-    await queue_manager.broadcast(queue_manager.queue_items)
     
     start_time = datetime.utcnow()
     
     try:
-        arrays = []
-        for audio in audio_files:
-            if not audio.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.ogg', '.flac')):
-                raise HTTPException(400, f"Unsupported audio format: {audio.filename}")
-            content = await audio.read()
-            
-            queue_manager.update_item(case.id, 20 + len(arrays) * 15, "preprocessing")
-            await queue_manager.broadcast(queue_manager.queue_items)
-            
-            waveform, sr = librosa.load(io.BytesIO(content), sr=16000)
-            arrays.append(waveform)
+        loop = asyncio.get_running_loop()
+        queue_manager.update_item(case.id, 20, "preprocessing")
+        
+        # Decode both clips concurrently on the thread pool
+        arrays = await asyncio.gather(*(
+            loop.run_in_executor(_CPU_POOL, load_audio, content, audio.filename)
+            for audio, content in zip(audio_files, contents)
+        ))
         
         queue_manager.update_item(case.id, 50, "analyzing")
-        await queue_manager.broadcast(queue_manager.queue_items)
         
-        if models_loaded and feature_extractor and speaker_model:
-            inputs = feature_extractor(arrays, sampling_rate=16000, padding=True, return_tensors="pt")
-            with torch.no_grad():
-                embeddings = speaker_model(**inputs).embeddings
-                embeddings = torch.nn.functional.normalize(embeddings, dim=-1).cpu()
+        if models_loaded:
+            embeddings = await asyncio.gather(*(speaker_batcher.submit(a) for a in arrays))
             
-            similarity = float(torch.nn.CosineSimilarity(dim=-1)(embeddings[0], embeddings[1]))
+            # Embeddings are already L2-normalized, so cosine similarity is their dot product
+            similarity = torch.dot(embeddings[0], embeddings[1]).item()
         else:
             # Mock response
-            similarity = np.random.uniform(0.5, 0.98)
+            similarity = _RNG.uniform(0.5, 0.98)
         
         threshold = 0.86
         is_same = similarity >= threshold
         confidence = similarity * 100
         
         queue_manager.update_item(case.id, 80, "llm_explaining")
-        await queue_manager.broadcast(queue_manager.queue_items)
         
         explanation = generate_explanation(is_same, confidence, "audio")
         
@@ -718,12 +1394,10 @@ async def detect_audio_manipulation(
         case.completed_at = datetime.utcnow()
         case.processing_time_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
         
-        db.commit()
+        # Persist the result and leave the queue once the response has been sent
+        background_tasks.add_task(_finalize_case, case)
         
-        queue_manager.remove_item(case.id)
-        await queue_manager.broadcast(queue_manager.queue_items)
-        
-        return {
+        result = {
             "caseId": case.id,
             "similarity_score": round(similarity, 4),
             "is_same_speaker": is_same,
@@ -736,105 +1410,98 @@ async def detect_audio_manipulation(
     except Exception as e:
         case.status = CaseStatus.failed
         case.verdict = "Analysis Failed"
-        db.commit()
+        db.add(case)
+        await db.commit()
         queue_manager.remove_item(case.id)
-        await queue_manager.broadcast(queue_manager.queue_items)
         raise HTTPException(500, f"Audio analysis failed: {str(e)}")
+    
+    # Cache only after the analysis has fully succeeded; a cache outage can't fail it
+    await idempotency_cache.set(idempotency_key, result)
+    return result
 
 @app.post("/api/detect/video")
 async def detect_video_manipulation(
+    background_tasks: BackgroundTasks,
     video: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    if not video.filename.lower().endswith(('.mp4', '.mov', '.avi', '.mkv', '.webm')):
+    if file_extension(video.filename) not in VIDEO_EXTENSIONS:
         raise HTTPException(400, "Invalid video format. Supported: mp4, mov, avi, mkv, webm")
     
-    # Create case record
+    # Hash while streaming to disk; retried uploads of the same bytes return the original result
+    hasher = hashlib.sha256()
+    # Keep the real extension so the demuxer isn't told a .mov/.mkv/.webm is an mp4
+    temp_path = await save_upload(video, suffix=f".{file_extension(video.filename)}", hasher=hasher)
+    idempotency_key = f"idem:video:{hasher.hexdigest()}"
+    cached = await idempotency_cache.get(idempotency_key)
+    if cached:
+        os.unlink(temp_path)
+        return cached
+    
+    # Create case record; the id and timestamp are set here because the row is only
+    # written once, when the case finishes
     case = Case(
+        id=new_case_id(),
+        submitted_at=datetime.utcnow(),
         media_type=MediaType.video,
         status=CaseStatus.analyzing,
         filename=video.filename,
-        worker_id=f"worker-{np.random.randint(1, 5)}"
+        worker_id=f"worker-{_RNG.integers(1, 5)}"
     )
-    db.add(case)
-    db.commit()
-    
     # Add to queue
     queue_item = {
         "id": case.id,
         "mediaType": "video",
-        "submittedAt": case.submitted_at.isoformat(),
+        "submittedAt": case.submitted_at,
         "progress": 0,
         "status": "preprocessing",
         "workerId": case.worker_id
     }
     queue_manager.add_item(queue_item)
-    await queue_manager.broadcast(queue_manager.queue_items)
     
     start_time = datetime.utcnow()
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
     
     try:
-        shutil.copyfileobj(video.file, temp_file)
-        temp_file.close()
-        
+        loop = asyncio.get_running_loop()
         queue_manager.update_item(case.id, 15, "preprocessing")
-        await queue_manager.broadcast(queue_manager.queue_items)
         
-        cap = cv2.VideoCapture(temp_file.name)
-        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        duration = total / fps if fps > 0 else 0
-        
-        # Sample 8 frames evenly
-        frame_indices = np.linspace(0, max(total-1, 0), 8, dtype=int)
-        frames = []
-        for i in frame_indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-            ret, frame = cap.read()
-            if ret:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frames.append(Image.fromarray(frame))
-        cap.release()
+        # Sample 8 frames evenly, pre-shrunk to the model input size
+        size = (image_processor.size["width"], image_processor.size["height"]) if models_loaded else None
+        frames, duration = await loop.run_in_executor(_CPU_POOL, lambda: extract_frames(temp_path, size=size))
         
         queue_manager.update_item(case.id, 30, "analyzing")
-        await queue_manager.broadcast(queue_manager.queue_items)
-        
-        results = []
-        fake_confidences = []
-        
-        if models_loaded and image_processor and image_model:
-            for idx, frame in enumerate(frames):
-                inputs = image_processor(images=frame, return_tensors="pt")
-                with torch.no_grad():
-                    logits = image_model(**inputs).logits
-                    prob = torch.softmax(logits, dim=1)[0]
-                    pred_idx = torch.argmax(logits, dim=1).item()
-                    conf = prob[pred_idx].item() * 100
-                    label = image_model.config.id2label[pred_idx]
-                    results.append({"label": label, "confidence": conf})
-                    if label.lower() in ["fake", "deepfake"]:
-                        fake_confidences.append(conf)
-                
-                progress = 30 + int((idx / len(frames)) * 40)
-                queue_manager.update_item(case.id, progress, "analyzing")
-                await queue_manager.broadcast(queue_manager.queue_items)
+        
+        if models_loaded and frames:
+            # Preprocess all frames at once and submit them together so the batcher
+            # classifies them in a single forward pass
+            pixel_values = (await loop.run_in_executor(
+                _CPU_POOL, lambda: image_processor(images=frames, return_tensors="pt")
+            ))["pixel_values"]
+            logits = torch.stack(await asyncio.gather(*(image_batcher.submit(pv) for pv in pixel_values)))
+            probs = torch.softmax(logits, dim=1)
+            confs, pred_idx = (probs * 100).max(dim=1)
+            confs, pred_idx = confs.numpy(), pred_idx.numpy()
+            
+            # Decide fake/real once per class, then index by each frame's prediction
+            class_is_fake = np.array([id2label[i].lower() in FAKE_LABELS for i in range(len(id2label))])
+            fake_mask = class_is_fake[pred_idx]
+            labels = [id2label[i] for i in pred_idx.tolist()]
+            
+            queue_manager.update_item(case.id, 70, "analyzing")
         else:
             # Mock response
-            for _ in frames:
-                is_fake = np.random.random() > 0.4
-                conf = np.random.uniform(60, 95) if is_fake else np.random.uniform(10, 40)
-                label = "Fake" if is_fake else "Real"
-                results.append({"label": label, "confidence": conf})
-                if is_fake:
-                    fake_confidences.append(conf)
-        
-        avg_fake_conf = np.mean(fake_confidences) if fake_confidences else 0
+            fake_mask = _RNG.random(len(frames)) > 0.4
+            confs = np.where(fake_mask, _RNG.uniform(60, 95, len(frames)), _RNG.uniform(10, 40, len(frames)))
+            labels = np.where(fake_mask, "Fake", "Real").tolist()
+        
+        results = [{"label": label, "confidence": conf} for label, conf in zip(labels, confs.tolist())]
+        
+        # Plain Python types so the result serializes and caches cleanly
+        avg_fake_conf = float(confs[fake_mask].mean()) if fake_mask.any() else 0.0
         is_fake = avg_fake_conf > 60
-        confidence = avg_fake_conf if is_fake else (100 - avg_fake_conf if avg_fake_conf > 0 else np.random.uniform(70, 90))
+        confidence = avg_fake_conf if is_fake else (100 - avg_fake_conf if avg_fake_conf > 0 else _RNG.uniform(70, 90))
         
         queue_manager.update_item(case.id, 80, "llm_explaining")
-        await queue_manager.broadcast(queue_manager.queue_items)
         
         explanation = generate_explanation(is_fake, confidence, "video")
         
@@ -842,19 +1509,18 @@ async def detect_video_manipulation(
         case.status = CaseStatus.completed
         case.confidence = round(confidence, 1)
         case.verdict = f"{confidence:.0f}% Likely {'Manipulated' if is_fake else 'Authentic'}"
-        case.face_score = round(confidence + np.random.uniform(-8, 8), 1)
-        case.voice_score = round(confidence + np.random.uniform(-10, 5), 1)
-        case.lipsync_score = round(confidence + np.random.uniform(-5, 10), 1)
+        face_jitter, voice_jitter, lipsync_jitter = _RNG.uniform([-8, -10, -5], [8, 5, 10])
+        case.face_score = round(confidence + face_jitter, 1)
+        case.voice_score = round(confidence + voice_jitter, 1)
+        case.lipsync_score = round(confidence + lipsync_jitter, 1)
         case.explanation = explanation
         case.completed_at = datetime.utcnow()
         case.processing_time_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
         
-        db.commit()
-        
-        queue_manager.remove_item(case.id)
-        await queue_manager.broadcast(queue_manager.queue_items)
+        # Persist the result and leave the queue once the response has been sent
+        background_tasks.add_task(_finalize_case, case)
         
-        return {
+        result = {
             "caseId": case.id,
             "filename": video.filename,
             "duration_sec": round(duration, 2),
@@ -869,24 +1535,32 @@ async def detect_video_manipulation(
     except Exception as e:
         case.status = CaseStatus.failed
         case.verdict = "Analysis Failed"
-        db.commit()
+        db.add(case)
+        await db.commit()
         queue_manager.remove_item(case.id)
-        await queue_manager.broadcast(queue_manager.queue_items)
         raise HTTPException(500, f"Video processing failed: {str(e)}")
     finally:
-        os.unlink(temp_file.name)
+        os.unlink(temp_path)
+    
+    # Cache only after the analysis has fully succeeded; a cache outage can't fail it
+    await idempotency_cache.set(idempotency_key, result)
+    return result
+
 
+# TwiML reply; the message must be XML-escaped before it is formatted in
+TWIML_TEMPLATE = '<?xml version="1.0" encoding="UTF-8"?><Response><Message>{}</Message></Response>'
 
 @app.post("/api/whatsapp/webhook")
 async def whatsapp_webhook(
     request: Request,
+    background_tasks: BackgroundTasks,
     From: str = Form(None),  # Sender's WhatsApp number
     Body: str = Form(None),  # Text message (if any)
     NumMedia: int = Form(0),  # Number of media files
     MediaUrl0: str = Form(None),  # URL of the first media
     MediaContentType0: str = Form(None),  # e.g., image/jpeg
     MessageSid: str = Form(None),  # Unique Twilio message ID
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Twilio WhatsApp Webhook: Receives image → triggers detection → optional reply."""
     
@@ -898,39 +1572,20 @@ async def whatsapp_webhook(
     if not MediaUrl0 or "image" not in MediaContentType0:
         return PlainTextResponse("")  # Ignore non-images
     
-    # Temp filename based on MessageSid
+    # Case filename based on MessageSid
     ext = MediaContentType0.split("/")[-1] or "jpg"
     if ext not in ["jpeg", "jpg", "png", "webp"]:
         ext = "jpg"
-    temp_filename = f"whatsapp_{MessageSid}.{ext}"
-    temp_path = f"/tmp/{temp_filename}"  # Use /tmp for temp files
+    filename = f"whatsapp_{MessageSid}.{ext}"
     
     try:
         # Download image from Twilio (public URL, no auth needed in webhook)
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(MediaUrl0, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
-            response.raise_for_status()
-
-            content = await response.aread()
-            async with aiofiles.open(temp_path, 'wb') as f:
-                await f.write(content)
-        
-        # Fake an UploadFile to reuse your detect_image_manipulation function
-        class FakeUploadFile:
-            def __init__(self, filename, file_path):
-                self.filename = filename
-                self.file = open(file_path, "rb")
-            
-            async def read(self):
-                return self.file.read()
-            
-            def close(self):
-                self.file.close()
-        
-        fake_file = FakeUploadFile(temp_filename, temp_path)
+        response = await http_client.get(MediaUrl0)
+        response.raise_for_status()
+        content = response.content
         
-        # Run your existing image detection (reuses AI, queue, DB)
-        result = await detect_image_manipulation(image=fake_file, db=db)
+        # Run the shared image detection on the downloaded bytes (reuses AI, queue, DB)
+        result = await _detect_image_from_bytes(content, filename, db, background_tasks)
         
         # Optional: Auto-reply to user via TwiML (XML for Twilio)
         is_fake = result.get("is_fake", False)
@@ -939,21 +1594,12 @@ async def whatsapp_webhook(
             f"Analysis complete! {'⚠ Deepfake detected' if is_fake else '✅ Appears authentic'} "
             f"({confidence:.0f}% confidence).\nCase ID: {result['caseId']}\nDetails: {result['verdict']}"
         )
-        twiml = f"""<?xml version="1.0" encoding="UTF-8"?>
-                   <Response><Message>{message}</Message></Response>"""
-        
-        return PlainTextResponse(twiml, media_type="application/xml")
+        return PlainTextResponse(TWIML_TEMPLATE.format(escape(message)), media_type="application/xml")
     
     except Exception as e:
         print(f"WhatsApp processing failed: {e}")
         # Optional: Reply with error
-        error_twiml = """<?xml version="1.0" encoding="UTF-8"?>
-                         <Response><Message>Sorry, processing failed. Try again!</Message></Response>"""
-        return PlainTextResponse(error_twiml, media_type="application/xml")
-    
-    finally:
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)  # Clean up temp file
+        return PlainTextResponse(TWIML_TEMPLATE.format("Sorry, processing failed. Try again!"), media_type="application/xml")
 
 # =============================================================================
 # Health Check